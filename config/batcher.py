@@ -0,0 +1,104 @@
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, WriteError
+from config.database import payments_collection
+import asyncio
+
+# A batch is flushed once it holds BATCH_MAX_OPS updates or has waited BATCH_MAX_DELAY seconds
+BATCH_MAX_OPS = 100
+BATCH_MAX_DELAY = 0.005
+
+# Queued by stop() to tell the batching loop to exit
+_STOP = object()
+
+# Coalesces concurrent update_one calls into unordered bulk_write batches
+class UpdateBatcher:
+    def __init__(self, collection, max_ops=BATCH_MAX_OPS, max_delay=BATCH_MAX_DELAY):
+        self._collection = collection
+        self._max_ops = max_ops
+        self._max_delay = max_delay
+        self._queue = asyncio.Queue()
+        self._flushes = set()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    # Queue a stop sentinel behind any pending updates so _run flushes them
+    # (including a batch it is still filling) before exiting
+    async def stop(self):
+        await self._queue.put(_STOP)
+        await self._task
+        await asyncio.gather(*self._flushes)
+
+    # Queue an update and wait for its batch; returns True if a document matched
+    async def update_one(self, filter, update):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((filter, update, future))
+        return await future
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            if self._queue.qsize() < self._max_ops - 1:
+                await asyncio.sleep(self._max_delay)
+            while len(batch) < self._max_ops and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            # Flush in the background so the next batch can start filling
+            flush = asyncio.create_task(self._flush(batch))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch):
+        ops = [UpdateOne(filter, update) for filter, update, _ in batch]
+        errors = {}
+        try:
+            result = await self._collection.bulk_write(ops, ordered=False)
+            matched_count = result.matched_count
+        except BulkWriteError as e:
+            errors = {error["index"]: error for error in e.details["writeErrors"]}
+            matched_count = e.details["nMatched"]
+        except Exception as e:
+            self._fail(batch, e)
+            return
+
+        # bulk_write only reports totals, so look up which filters matched
+        # only when some update in the batch missed
+        succeeded = [i for i in range(len(batch)) if i not in errors]
+        if matched_count == len(succeeded):
+            matched = dict.fromkeys(succeeded, True)
+        else:
+            try:
+                found = await asyncio.gather(
+                    *(self._collection.find_one(batch[i][0], {"_id": 1}) for i in succeeded)
+                )
+            except Exception as e:
+                self._fail(batch, e)
+                return
+            matched = {i: doc is not None for i, doc in zip(succeeded, found)}
+
+        # Callers may have been cancelled while waiting; skip their futures
+        for i, (_, _, future) in enumerate(batch):
+            if future.done():
+                continue
+            if i in errors:
+                future.set_exception(WriteError(errors[i]["errmsg"], errors[i]["code"], errors[i]))
+            else:
+                future.set_result(matched[i])
+
+    @staticmethod
+    def _fail(batch, exception):
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(exception)
+
+# Shared batcher for single-payment updates issued by the routes
+payment_updates = UpdateBatcher(payments_collection)
\ No newline at end of file
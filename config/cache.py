@@ -0,0 +1,60 @@
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+from dotenv import load_dotenv
+import os
+
+# Load environment variables from .env
+load_dotenv()
+
+# Seconds a cached payments listing stays valid
+PAYMENTS_CACHE_TTL = int(os.getenv("PAYMENTS_CACHE_TTL", 30))
+PAYMENTS_CACHE_PREFIX = "payments:"
+# Bumped on every payment write; listings cached under an older generation are
+# never read again and simply expire
+PAYMENTS_CACHE_GEN_KEY = PAYMENTS_CACHE_PREFIX + "gen"
+
+# Caching is optional: without REDIS_URL every request goes to MongoDB
+redis_url = os.getenv("REDIS_URL")
+cache = redis.Redis.from_url(redis_url) if redis_url else None
+
+if cache is None:
+    print("REDIS_URL not found in environment variables. Response caching disabled.")
+
+# Cache errors are logged and treated as misses so Redis never breaks a request
+async def payments_cache_key(params):
+    if cache is None:
+        return None
+    try:
+        generation = int(await cache.get(PAYMENTS_CACHE_GEN_KEY) or 0)
+    except RedisError as e:
+        print(f"Cache read failed: {e}")
+        return None
+    return f"{PAYMENTS_CACHE_PREFIX}{generation}:{params}"
+
+async def get_cached(key):
+    if cache is None or key is None:
+        return None
+    try:
+        return await cache.get(key)
+    except RedisError as e:
+        print(f"Cache read failed: {e}")
+        return None
+
+async def set_cached(key, value):
+    if cache is None or key is None:
+        return
+    try:
+        await cache.setex(key, PAYMENTS_CACHE_TTL, value)
+    except RedisError as e:
+        print(f"Cache write failed: {e}")
+
+# Orphan every cached payments listing (called after any payment write). A
+# listing computed before the bump is stored under the old generation, so it
+# can't be served after the write even if its set lands late.
+async def invalidate_payments_cache():
+    if cache is None:
+        return
+    try:
+        await cache.incr(PAYMENTS_CACHE_GEN_KEY)
+    except RedisError as e:
+        print(f"Cache invalidation failed: {e}")
\ No newline at end of file
@@ -1,4 +1,6 @@
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
 from pymongo import MongoClient
+from pymongo.write_concern import WriteConcern
 from dotenv import load_dotenv
 import os
 
@@ -10,13 +12,28 @@ mongo_uri = os.getenv("MONGO_URI")
 if not mongo_uri:
     raise ValueError("MONGO_URI not found in environment variables")
 
-# Initialize MongoDB client
-client = MongoClient(mongo_uri)
+# Connection options shared by both clients (wire compression, retryable writes).
+# tz_aware returns stored datetimes as UTC-aware, so responses carry a +00:00 offset.
+client_options = {"compressors": "zstd,zlib", "retryWrites": True, "tz_aware": True}
+
+# Initialize the asynchronous MongoDB client used by the API routes
+client = AsyncIOMotorClient(mongo_uri, maxPoolSize=500, minPoolSize=50, **client_options)
 
 # Define database and collections
 db = client.payment_db
 payments_collection = db.payments
 evidence_collection = db.evidence
 import_log_collection = db.import_log  # Collection to track CSV imports
+evidence_fs = AsyncIOMotorGridFSBucket(db, bucket_name="evidence_fs")  # Evidence file contents
+
+# Synchronous client for the CSV ingest and index setup, which run outside the event loop
+sync_client = MongoClient(mongo_uri, **client_options)
+sync_db = sync_client.payment_db
+sync_payments_collection = sync_db.payments
+sync_import_log_collection = sync_db.import_log
+
+# Write concern for bulk CSV inserts; w=1 reports rows rejected by the schema
+# validator, INGEST_WRITE_CONCERN=0 skips acknowledgement for faster loads
+ingest_write_concern = WriteConcern(w=int(os.getenv("INGEST_WRITE_CONCERN", 1)))
 
 print("MongoDB connection established successfully.")
\ No newline at end of file
@@ -1,16 +1,16 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from pymongo import ASCENDING, TEXT
+from fastapi.responses import ORJSONResponse
 from routes.route import router
-import pandas as pd
-from models.payments import Payment
-from config.database import payments_collection, import_log_collection
-from cryptography.fernet import Fernet
-from dotenv import load_dotenv
+from config.database import payments_collection
+from config.batcher import payment_updates
+from config.cache import invalidate_payments_cache
 import os
-from io import StringIO
+from datetime import datetime, timedelta, timezone
+import asyncio
+import uvicorn
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,104 +22,56 @@ app.add_middleware(
 
 app.include_router(router)
 
-if __name__ == "__main__":
-    port = int(os.getenv("PORT", 8000))  # Default to 8000 if PORT is not set
-    uvicorn.run(app, host="0.0.0.0", port=port)
-
-# Load the encryption key from .env
-load_dotenv()
-key = os.getenv("ENCRYPTION_KEY")
-if not key:
-    raise ValueError("ENCRYPTION_KEY not found in the .env file")
-
-fernet = Fernet(key.encode())
-
-# Normalize and save data
-def normalize_and_save(csv_file_path):
-    try:
-        # Check if the file has already been processed
-        if import_log_collection.find_one({"file_name": csv_file_path}):
-            print(f"The file '{csv_file_path}' has already been processed. Skipping insertion.")
-            return
-
-        # Read and decrypt the encrypted file
-        with open(csv_file_path, "rb") as encrypted_file:
-            encrypted_data = encrypted_file.read()
-        decrypted_data = fernet.decrypt(encrypted_data)
-
-        # Load the decrypted CSV content into a DataFrame
-        df = pd.read_csv(StringIO(decrypted_data.decode()), keep_default_na=False)
-        
-        # Normalize data and validate using Pydantic
-        payments = []
-        for record in df.to_dict(orient="records"):
-            record["payee_country"] = str(record["payee_country"])
-            record["payee_postal_code"] = str(record["payee_postal_code"])
-            record["payee_phone_number"] = str(record["payee_phone_number"])
-
-
-            payment = Payment(**record)
-            payment.total_due = round(
-                payment.due_amount * (1 - payment.discount_percent / 100)
-                * (1 + payment.tax_percent / 100), 2
-            )
-            payments.append(payment.dict())
-        
-        # Insert into MongoDB
-        payments_collection.insert_many(payments)
+# How often (in seconds) payment statuses are refreshed from their due dates
+STATUS_SWEEP_INTERVAL = int(os.getenv("STATUS_SWEEP_INTERVAL", 60))
 
-        # Log the file as processed
-        import_log_collection.insert_one({"file_name": csv_file_path})
-
-        return {"message": "CSV data uploaded successfully!"}
-
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error processing file: {e}")
-    
-# Function to create indexes if they don't already exist
-def create_indexes():
-    # List of indexes to ensure
-    indexes_to_create = [
-        {"fields": [("payee_payment_status", ASCENDING)], "name": "payment_status_index"},
-        {"fields": [("payee_due_date", ASCENDING)], "name": "due_date_index"},
+# Ensure payee_payment_status reflects the current date (two server-side updates)
+async def update_payment_statuses():
+    now = datetime.now(timezone.utc)
+    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    end_of_day = start_of_day + timedelta(days=1)
+    overdue = await payments_collection.update_many(
         {
-            "fields": [
-                ("payee_first_name", TEXT),
-                ("payee_last_name", TEXT),
-                ("payee_email", TEXT),
-                ("payee_address_line_1", TEXT),
-                ("payee_address_line_2", TEXT),
-                ("payee_city", TEXT),
-                ("payee_country", TEXT),
-                ("payee_province_or_state", TEXT),
-            ],
-            "name": "all_text_fields_index",
+            "payee_due_date": {"$lt": now},
+            "payee_payment_status": {"$nin": ["completed", "overdue"]},
         },
+        {"$set": {"payee_payment_status": "overdue"}},
+    )
+    due_now = await payments_collection.update_many(
         {
-            "fields": [
-                ("payee_payment_status", ASCENDING),
-                ("payee_due_date", ASCENDING),
-            ],
-            "name": "status_due_date_index",
+            "payee_due_date": {"$gte": now, "$lt": end_of_day},
+            "payee_payment_status": {"$nin": ["completed", "due_now"]},
         },
-    ]
-
-    # Get existing indexes
-    existing_indexes = payments_collection.index_information()
-
-    # Create missing indexes
-    for index in indexes_to_create:
-        if index["name"] not in existing_indexes:
-            payments_collection.create_index(index["fields"], name=index["name"])
-            print(f"Index '{index['name']}' created.")
-        else:
-            print(f"Index '{index['name']}' already exists. Skipping.")
+        {"$set": {"payee_payment_status": "due_now"}},
+    )
+    if overdue.modified_count or due_now.modified_count:
+        await invalidate_payments_cache()
+
+# Background task that keeps statuses up to date outside the request path
+async def run_status_sweep():
+    while True:
+        try:
+            await update_payment_statuses()
+        except Exception as e:
+            print(f"Payment status sweep failed: {e}")
+        await asyncio.sleep(STATUS_SWEEP_INTERVAL)
+
+@app.on_event("startup")
+async def start_payment_updates():
+    payment_updates.start()
+
+@app.on_event("shutdown")
+async def stop_payment_updates():
+    await payment_updates.stop()
+
+@app.on_event("startup")
+async def start_status_sweep():
+    app.state.status_sweep = asyncio.create_task(run_status_sweep())
+
+@app.on_event("shutdown")
+async def stop_status_sweep():
+    app.state.status_sweep.cancel()
 
-# Decrypt and process the CSV file
-result = normalize_and_save("payment_information.csv")
-
-if result:
-    print(result)
-
-# Call the function to ensure indexes exist
-create_indexes()
\ No newline at end of file
+if __name__ == "__main__":
+    port = int(os.getenv("PORT", 8000))  # Default to 8000 if PORT is not set
+    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
@@ -2,23 +2,62 @@ from pydantic import BaseModel, Field, EmailStr
 from typing import Optional
 from datetime import datetime
 
+# Field patterns, shared with the collection's $jsonSchema validator below.
+# Pydantic compiles them once when the model class is built.
+PAYMENT_STATUS_PATTERN = r"^(completed|due_now|overdue|pending)$"
+COUNTRY_PATTERN = r"^[A-Z]{2}$"  # ISO 3166-1 alpha-2
+PHONE_NUMBER_PATTERN = r"^\+?[1-9]\d{1,14}$"  # E.164 format
+CURRENCY_PATTERN = r"^[A-Z]{3}$"  # ISO 4217
+
 
 class Payment(BaseModel):
     payee_first_name: str
     payee_last_name: str
-    payee_payment_status: str = Field(..., pattern="^(completed|due_now|overdue|pending)$")
+    payee_payment_status: str = Field(..., pattern=PAYMENT_STATUS_PATTERN)
     payee_added_date_utc: datetime
     payee_due_date: datetime
     payee_address_line_1: str
     payee_address_line_2: Optional[str]
     payee_city: str
-    payee_country: str = Field(..., pattern="^[A-Z]{2}$")  # ISO 3166-1 alpha-2
+    payee_country: str = Field(..., pattern=COUNTRY_PATTERN)
     payee_province_or_state: Optional[str]
     payee_postal_code: str
-    payee_phone_number: str = Field(..., pattern="^\+?[1-9]\d{1,14}$")  # E.164 format
+    payee_phone_number: str = Field(..., pattern=PHONE_NUMBER_PATTERN)
     payee_email: EmailStr
-    currency: str = Field(..., pattern="^[A-Z]{3}$")  # ISO 4217
+    currency: str = Field(..., pattern=CURRENCY_PATTERN)
     discount_percent: Optional[float]
     tax_percent: Optional[float]
     due_amount: float
-    total_due: Optional[float] = None  # Calculated field
\ No newline at end of file
+    total_due: Optional[float] = None  # Calculated field
+
+# Server-side schema enforced on the payments collection (mirrors Payment)
+_STRING = {"bsonType": "string"}
+_OPTIONAL_STRING = {"bsonType": ["string", "null"]}
+_NUMBER = {"bsonType": "number"}
+_OPTIONAL_NUMBER = {"bsonType": ["number", "null"]}
+_DATE = {"bsonType": "date"}
+
+PAYMENT_JSON_SCHEMA = {
+    "bsonType": "object",
+    "required": [field for field in Payment.model_fields if field != "total_due"],
+    "properties": {
+        "payee_first_name": _STRING,
+        "payee_last_name": _STRING,
+        "payee_payment_status": {"bsonType": "string", "pattern": PAYMENT_STATUS_PATTERN},
+        "payee_added_date_utc": _DATE,
+        "payee_due_date": _DATE,
+        "payee_address_line_1": _STRING,
+        "payee_address_line_2": _OPTIONAL_STRING,
+        "payee_city": _STRING,
+        "payee_country": {"bsonType": "string", "pattern": COUNTRY_PATTERN},
+        "payee_province_or_state": _OPTIONAL_STRING,
+        "payee_postal_code": _STRING,
+        "payee_phone_number": {"bsonType": "string", "pattern": PHONE_NUMBER_PATTERN},
+        "payee_email": {"bsonType": "string", "pattern": r"^[^@\s]+@[^@\s]+\.[^@\s]+$"},
+        "currency": {"bsonType": "string", "pattern": CURRENCY_PATTERN},
+        "discount_percent": _OPTIONAL_NUMBER,
+        "tax_percent": _OPTIONAL_NUMBER,
+        "due_amount": _NUMBER,
+        "total_due": _OPTIONAL_NUMBER,
+    },
+}
\ No newline at end of file
@@ -1,15 +1,39 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Query
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pymongo import ASCENDING
-from pymongo.errors import InvalidId
-from bson import ObjectId
+from pymongo.errors import OperationFailure, WriteError
+from bson.errors import BSONError, InvalidId
+from bson import ObjectId, json_util
 from datetime import datetime, timezone
+import re
+import asyncio
+import base64
 from models.payments import Payment
-from config.database import payments_collection, evidence_collection
-from schema.schemas import list_serial
+from config.database import client, payments_collection, evidence_collection, evidence_fs
+from config.batcher import payment_updates
+from config.cache import get_cached, set_cached, invalidate_payments_cache, payments_cache_key
+from schema.schemas import list_serial, PAYMENT_FIELDS
+import orjson
 
 router = APIRouter()
 
+# Fields returned by the list endpoint (everything individual_serial reads)
+_PAYMENT_PROJECTION = dict.fromkeys(PAYMENT_FIELDS, 1)
+
+# Largest page GET /payments/ serves (keeps the $facet result well under 16MB)
+MAX_PAGE_SIZE = 100
+
+# GET /payments/ only sorts by a payment field: sort_by becomes a $match and
+# $project key and its value is stored in the cursor, so it must be a plain
+# top-level scalar field (never _id, a dotted path or an operator)
+SORT_FIELD_PATTERN = "^(" + "|".join(PAYMENT_FIELDS) + ")$"
+
+# Sort fields backed by a (..., field, _id) index in scripts/migrate.py
+INDEXED_SORT_FIELDS = {"payee_last_name"}
+
+# Bytes read from an uploaded file per GridFS write
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
 # Helper function for ObjectId validation
 def validate_object_id(id_str):
     try:
@@ -17,18 +41,69 @@ def validate_object_id(id_str):
     except InvalidId:
         raise HTTPException(status_code=400, detail="Invalid ID format.")
 
+# Helper functions for the opaque keyset pagination cursor (last sort value and _id).
+# Dates decode UTC-aware, like everything the tz_aware client returns.
+_CURSOR_JSON_OPTIONS = json_util.JSONOptions(tz_aware=True, tzinfo=timezone.utc)
+
+def encode_cursor(payment, sort_by):
+    cursor = json_util.dumps([payment.get(sort_by), payment["_id"]])
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        last_value, last_id = json_util.loads(
+            base64.urlsafe_b64decode(cursor.encode()), json_options=_CURSOR_JSON_OPTIONS
+        )
+    # Malformed extended JSON raises more than ValueError: e.g. a bad $oid
+    # (InvalidId), $numberDecimal (decimal.InvalidOperation) or $date (IndexError)
+    except (ValueError, TypeError, LookupError, ArithmeticError, BSONError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor.")
+    # The cursor comes from the client: only accept a plain scalar sort value
+    # and an ObjectId so it can never inject query operators (json_util would
+    # otherwise decode e.g. {"$regex": ...} into a Regex)
+    scalar = last_value is None or isinstance(last_value, (str, int, float, datetime))
+    if not scalar or not isinstance(last_id, ObjectId):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor.")
+    return last_value, last_id
+
+# Rows strictly after (last_value, last_id) in (sort_by, _id) order. MongoDB sorts
+# null/missing values before everything else, and comparison operators never
+# match null, so nullable sort fields need explicit null branches.
+def keyset_filter(sort_by, sort_direction, last_value, last_id):
+    op = "$gt" if sort_direction == ASCENDING else "$lt"
+    branches = [{sort_by: last_value, "_id": {op: last_id}}]
+    if last_value is None:
+        if sort_direction == ASCENDING:
+            branches.append({sort_by: {"$ne": None}})
+    else:
+        branches.append({sort_by: {op: last_value}})
+        if sort_direction != ASCENDING:
+            branches.append({sort_by: None})
+    return {"$or": branches}
+
+# Helper generator yielding a GridFS file chunk by chunk
+async def iter_gridfs_chunks(grid_out):
+    while chunk := await grid_out.readchunk():
+        yield chunk
+
 # GET Request
 @router.get("/payments/")
 async def get_payments(
     status: str = Query(None),
     search: str = Query(None),
-    page: int = 1,
-    size: int = 20,
-    sort_by: str = Query("payee_last_name"),  # Default sort field
-    sort_order: str = Query("asc")          # Default sort order
+    page: int = Query(1, ge=1),
+    size: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    sort_by: str = Query("payee_last_name", pattern=SORT_FIELD_PATTERN),  # Default sort field
+    sort_order: str = Query("asc"),         # Default sort order
+    after: str = Query(None)                # next_cursor of the previous page
 ):
-    # Perform status calculations
-    now = datetime.now(timezone.utc)
+    # Serve repeated listings straight from the cache
+    cache_key = await payments_cache_key(orjson.dumps(
+        [status, search, page, size, sort_by, sort_order, after]
+    ).decode())
+    cached = await get_cached(cache_key)
+    if cached:
+        return Response(content=cached, media_type="application/json")
 
     # Build the query
     query = {}
@@ -36,62 +111,106 @@ async def get_payments(
         query["payee_payment_status"] = status
 
     # Handle search (different logic for email searches)
+    search_stages = []
     if search:
         if "@" in search:
-            query["payee_email"] = {"$regex": search, "$options": "i"}  # Case-insensitive email search
+            # Anchored prefix match on the lowercased email can use email_lower_index
+            query["payee_email_lower"] = {"$regex": "^" + re.escape(search.lower())}
         else:
-            query["$text"] = {"$search": search}
-
-    # Ensure payee_due_date is updated based on current date
-    payments_to_update = payments_collection.find({"payee_due_date": {"$exists": True}})
-    for payment in payments_to_update:
-        payee_due_date = payment["payee_due_date"]
-        if isinstance(payee_due_date, datetime) and payee_due_date.tzinfo is None:
-            payee_due_date = payee_due_date.replace(tzinfo=timezone.utc)
-
-        new_status = payment["payee_payment_status"]
-        if payee_due_date < now:
-            new_status = "overdue"
-        elif payee_due_date.date() == now.date():
-            new_status = "due_now"
-
-        if new_status != payment["payee_payment_status"]:
-            payments_collection.update_one(
-                {"_id": payment["_id"]},
-                {"$set": {"payee_payment_status": new_status}},
-            )
-
-    # Determine sort direction
+            # Free-text search across the fields mapped in the Atlas Search index
+            search_stages.append({
+                "$search": {
+                    "index": "payments_search",
+                    "text": {"query": search, "path": {"wildcard": "*"}},
+                }
+            })
+
+    # Determine sort direction (_id breaks ties so the order is stable across pages)
     sort_direction = ASCENDING if sort_order == "asc" else -1
-
-    # Perform the query with pagination and sorting
-    payments = (
-        payments_collection.find(query)
-        .sort(sort_by, sort_direction)  # Use sort_by and sort_order for sorting
-        .skip((page - 1) * size)
-        .limit(size)
-    )
-
-    # Calculate total count for the query
-    total = payments_collection.count_documents(query)
-
-    return {"total": total, "page": page, "size": size, "data": list_serial(payments)}
+    sort = {sort_by: sort_direction, "_id": sort_direction}
+    projection = {**_PAYMENT_PROJECTION, sort_by: 1}
+
+    if after:
+        # Keyset pagination: seek past the last row of the previous page instead
+        # of skipping, and count the full result set concurrently
+        last_value, last_id = decode_cursor(after)
+        keyset = keyset_filter(sort_by, sort_direction, last_value, last_id)
+        data_pipeline = search_stages + [
+            {"$match": {"$and": [query, keyset]}},
+            {"$sort": sort},
+            {"$limit": size},
+            {"$project": projection},
+        ]
+        count_pipeline = search_stages + [{"$match": query}, {"$count": "total"}]
+        data, meta = await asyncio.gather(
+            payments_collection.aggregate(data_pipeline).to_list(size),
+            payments_collection.aggregate(count_pipeline).to_list(1),
+        )
+    else:
+        # Fetch the requested page and the total count in a single aggregation
+        page_stages = [
+            {"$skip": (page - 1) * size},
+            {"$limit": size},
+            {"$project": projection},
+        ]
+        pipeline = search_stages + [{"$match": query}]
+        if sort_by in INDEXED_SORT_FIELDS and not search_stages:
+            # Sorting before $facet walks the index in order, no in-memory sort
+            pipeline.append({"$sort": sort})
+        else:
+            # Nothing to walk in order: sort inside the data branch, where the
+            # following $limit bounds it to a top-(skip + size) sort
+            page_stages.insert(0, {"$sort": sort})
+        pipeline.append({
+            "$facet": {
+                "data": page_stages,
+                "meta": [{"$count": "total"}],
+            }
+        })
+        result = (await payments_collection.aggregate(pipeline).to_list(1))[0]
+        data, meta = result["data"], result["meta"]
+
+    total = meta[0]["total"] if meta else 0
+    next_cursor = encode_cursor(data[-1], sort_by) if len(data) == size else None
+
+    # Returning the response directly lets orjson encode datetimes natively
+    # instead of running the payload through jsonable_encoder first
+    response = ORJSONResponse({
+        "total": total,
+        "page": page,
+        "size": size,
+        "next_cursor": next_cursor,
+        "data": list_serial(data),
+    })
+    await set_cached(cache_key, response.body)
+    return response
 
 # Update Payment
 @router.put("/payments/{payment_id}/")
 async def update_payment(payment_id: str, payment_update: dict):
     payment_id = validate_object_id(payment_id)
     if payment_update.get("payee_payment_status") == "completed":
-        evidence = evidence_collection.find_one({"payment_id": str(payment_id)})
+        evidence = await evidence_collection.find_one({"payment_id": str(payment_id)})
         if not evidence:
             raise HTTPException(
                 status_code=400,
                 detail="Cannot mark payment as completed without evidence."
             )
 
-    result = payments_collection.update_one({"_id": payment_id}, {"$set": payment_update})
-    if not result.matched_count:
+    # Keep the lowercased search field in sync with the email
+    if isinstance(payment_update.get("payee_email"), str):
+        payment_update["payee_email_lower"] = payment_update["payee_email"].lower()
+
+    # Concurrent updates are coalesced into one bulk_write by the batcher
+    try:
+        matched = await payment_updates.update_one({"_id": payment_id}, {"$set": payment_update})
+    except WriteError as e:
+        if e.code != 121:  # DocumentValidationFailure
+            raise
+        raise HTTPException(status_code=400, detail="Payment update does not match the payment schema.")
+    if not matched:
         raise HTTPException(status_code=404, detail="Payment not found.")
+    await invalidate_payments_cache()
     return {"message": "Payment updated successfully."}
 
 # Delete Payment
@@ -101,22 +220,27 @@ async def delete_payment(payment_id: str):
     payment_id = validate_object_id(payment_id)
 
     # Check if the payment exists
-    payment = payments_collection.find_one({"_id": payment_id})
+    payment = await payments_collection.find_one({"_id": payment_id})
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found.")
 
     # Check if the payment is completed before deleting evidence
     deleted_evidence_count = 0
     if payment["payee_payment_status"] == "completed":
-        # Cascade delete evidence files
-        evidence_result = evidence_collection.delete_many({"payment_id": str(payment_id)})
+        # Cascade delete evidence files (GridFS contents first, then the records)
+        async for evidence in evidence_collection.find(
+            {"payment_id": str(payment_id), "gridfs_id": {"$exists": True}}, {"gridfs_id": 1}
+        ):
+            await evidence_fs.delete(evidence["gridfs_id"])
+        evidence_result = await evidence_collection.delete_many({"payment_id": str(payment_id)})
         deleted_evidence_count = evidence_result.deleted_count
 
     # Delete the payment record
-    payment_result = payments_collection.delete_one({"_id": payment_id})
+    payment_result = await payments_collection.delete_one({"_id": payment_id})
 
     # Return appropriate response
     if payment_result.deleted_count == 1:
+        await invalidate_payments_cache()
         return {
             "message": "Payment deleted successfully.",
             "deleted_evidence_count": deleted_evidence_count,
@@ -163,7 +287,10 @@ async def create_payment(payment: Payment):
         )
 
         # Insert payment into MongoDB
-        result = payments_collection.insert_one(payment.dict())
+        payment_data = payment.dict()
+        payment_data["payee_email_lower"] = payment.payee_email.lower()
+        result = await payments_collection.insert_one(payment_data)
+        await invalidate_payments_cache()
 
         return {
             "message": "Payment created successfully.",
@@ -175,6 +302,18 @@ async def create_payment(payment: Payment):
             detail=f"An error occurred while creating the payment: {e}",
         )
 
+# Insert an evidence record and mark its payment as 'completed'
+async def record_evidence(evidence, payment_id, session=None):
+    evidence_result = await evidence_collection.insert_one(evidence, session=session)
+    status_filter = {"_id": payment_id}
+    status_update = {"$set": {"payee_payment_status": "completed"}}
+    if session is None:
+        await payment_updates.update_one(status_filter, status_update)
+    else:
+        # Writes inside a transaction must stay on its session, so they are not batched
+        await payments_collection.update_one(status_filter, status_update, session=session)
+    return evidence_result.inserted_id
+
 # Upload Evidence
 @router.post("/payments/{payment_id}/upload-evidence/")
 async def upload_evidence(payment_id: str, file: UploadFile = File(...)):
@@ -185,22 +324,42 @@ async def upload_evidence(payment_id: str, file: UploadFile = File(...)):
     payment_id = validate_object_id(payment_id)
 
     # Check if the payment exists
-    payment = payments_collection.find_one({"_id": payment_id})
+    payment = await payments_collection.find_one({"_id": payment_id})
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found.")
 
-    # Save the evidence file in MongoDB
-    evidence_id = evidence_collection.insert_one({
+    # Stream the evidence file into GridFS and reference it from the evidence record
+    grid_in = evidence_fs.open_upload_stream(
+        file.filename,
+        metadata={"payment_id": str(payment_id), "content_type": file.content_type},
+    )
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await grid_in.write(chunk)
+    except Exception:
+        await grid_in.abort()
+        raise
+    await grid_in.close()
+    evidence = {
         "payment_id": str(payment_id),  # Store as a string for consistency
         "filename": file.filename,
-        "content": await file.read(),
-    }).inserted_id
+        "gridfs_id": grid_in._id,
+    }
 
-    # Update the payment status to 'completed'
-    payments_collection.update_one(
-        {"_id": payment_id},
-        {"$set": {"payee_payment_status": "completed"}}
-    )
+    # Insert the evidence record and complete the payment in one transaction
+    try:
+        try:
+            async with await client.start_session() as session:
+                async with session.start_transaction():
+                    evidence_id = await record_evidence(evidence, payment_id, session)
+        except OperationFailure as e:
+            if e.code != 20:  # IllegalOperation: standalone servers have no transactions
+                raise
+            evidence_id = await record_evidence(evidence, payment_id)
+    except Exception:
+        await evidence_fs.delete(grid_in._id)
+        raise
+    await invalidate_payments_cache()
 
     return {
         "message": "Evidence uploaded successfully and payment status updated to 'completed'.",
@@ -211,12 +370,19 @@ async def upload_evidence(payment_id: str, file: UploadFile = File(...)):
 @router.get("/payments/{payment_id}/download-evidence/")
 async def download_evidence(payment_id: str):
     payment_id = validate_object_id(payment_id)
-    evidence = evidence_collection.find_one({"payment_id": str(payment_id)})
+    evidence = await evidence_collection.find_one({"payment_id": str(payment_id)})
     if not evidence:
         raise HTTPException(status_code=404, detail="Evidence not found.")
     
-    # Stream the file content
+    # Stream the file content from GridFS one chunk at a time
+    if "gridfs_id" in evidence:
+        grid_out = await evidence_fs.open_download_stream(evidence["gridfs_id"])
+        content = iter_gridfs_chunks(grid_out)
+    else:
+        # Evidence uploaded before GridFS storage keeps its bytes inline
+        content = iter([evidence["content"]])
+
     return StreamingResponse(
-        iter([evidence["content"]]),
+        content,
         headers={"Content-Disposition": f'attachment; filename="{evidence["filename"]}"'},
     )
\ No newline at end of file
@@ -0,0 +1,190 @@
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import pandas as pd
+from models.payments import Payment
+from config.database import (
+    mongo_uri,
+    client_options,
+    ingest_write_concern,
+    sync_import_log_collection,
+)
+from cryptography.fernet import Fernet
+from dotenv import load_dotenv
+import os
+import sys
+import io
+import hashlib
+
+# Load the encryption key from .env
+load_dotenv()
+key = os.getenv("ENCRYPTION_KEY")
+if not key:
+    raise ValueError("ENCRYPTION_KEY not found in the .env file")
+
+fernet = Fernet(key.encode())
+
+# Plaintext bytes per encrypted frame written by encrypt_csv
+ENCRYPTION_FRAME_SIZE = 64 * 1024
+
+# Encrypted CSVs are newline-delimited Fernet tokens ("frames"), so they can be
+# decrypted one frame at a time. A file holding a single token (the original
+# export format) is simply a one-frame file.
+class DecryptingReader(io.RawIOBase):
+    def __init__(self, encrypted_file):
+        self._frames = (fernet.decrypt(line.strip()) for line in encrypted_file if line.strip())
+        self._frame = b""
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self._offset >= len(self._frame):
+            self._frame = next(self._frames, None)
+            self._offset = 0
+            if self._frame is None:
+                self._frame = b""
+                return 0
+        size = min(len(buffer), len(self._frame) - self._offset)
+        buffer[:size] = self._frame[self._offset:self._offset + size]
+        self._offset += size
+        return size
+
+# Encrypt a plaintext CSV into the framed format read by DecryptingReader
+def encrypt_csv(csv_file_path, encrypted_file_path, frame_size=ENCRYPTION_FRAME_SIZE):
+    with open(csv_file_path, "rb") as plain_file, open(encrypted_file_path, "wb") as encrypted_file:
+        while frame := plain_file.read(frame_size):
+            encrypted_file.write(fernet.encrypt(frame) + b"\n")
+
+# Number of CSV rows normalized and inserted per insert_many batch
+INGEST_CHUNK_SIZE = 1000
+
+# Number of worker processes normalizing and inserting chunks in parallel
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+
+# Parse a CSV date column (Unix seconds or date strings) as UTC datetimes
+def to_utc_datetime(column):
+    if pd.api.types.is_numeric_dtype(column):
+        return pd.to_datetime(column, unit="s", utc=True)
+    return pd.to_datetime(column, utc=True)
+
+# Deterministic _id for a CSV row, so re-running an interrupted import hits
+# duplicate keys instead of inserting the same rows twice
+def row_object_id(csv_file_path, row_number):
+    digest = hashlib.sha256(f"{csv_file_path}:{row_number}".encode()).digest()
+    return ObjectId(digest[:12])
+
+# Normalize a chunk of CSV rows into payment documents
+def normalize_chunk(df, csv_file_path):
+    text_columns = ["payee_country", "payee_postal_code", "payee_phone_number"]
+    df[text_columns] = df[text_columns].astype(str)
+    df["payee_added_date_utc"] = to_utc_datetime(df["payee_added_date_utc"])
+    df["payee_due_date"] = to_utc_datetime(df["payee_due_date"])
+    df["total_due"] = (
+        df["due_amount"]
+        * (1 - df["discount_percent"].fillna(0) / 100)
+        * (1 + df["tax_percent"].fillna(0) / 100)
+    ).round(2)
+
+    # Keep only the model fields (plus the row-derived _id and the lowercased
+    # email used for prefix search); the collection's $jsonSchema validator
+    # checks each document. Chunks keep the file's row numbers as their index.
+    return (
+        df[list(Payment.model_fields)]
+        .assign(
+            _id=[row_object_id(csv_file_path, row_number) for row_number in df.index],
+            payee_email_lower=df["payee_email"].str.lower(),
+        )
+        .to_dict(orient="records")
+    )
+
+# Collection handle owned by each worker process (MongoClient is not fork-safe)
+_worker_collection = None
+
+def _init_worker():
+    global _worker_collection
+    worker_client = MongoClient(mongo_uri, **client_options)
+    _worker_collection = worker_client.payment_db.get_collection(
+        "payments", write_concern=ingest_write_concern
+    )
+
+# Normalize and insert one chunk; returns the rows already imported, the rows
+# rejected and the first rejection error
+def _ingest_chunk(chunk, csv_file_path):
+    try:
+        _worker_collection.insert_many(normalize_chunk(chunk, csv_file_path), ordered=False)
+    except BulkWriteError as e:
+        # Duplicate keys are rows a previous, interrupted run already inserted;
+        # anything else was rejected (e.g. by the schema validator). Only
+        # reported when INGEST_WRITE_CONCERN acknowledges writes (w >= 1)
+        write_errors = e.details["writeErrors"]
+        rejected = [error for error in write_errors if error["code"] != 11000]
+        first_error = rejected[0]["errmsg"] if rejected else None
+        return len(write_errors) - len(rejected), len(rejected), first_error
+    return 0, 0, None
+
+# Normalize and save data
+def normalize_and_save(csv_file_path):
+    # Check if the file has already been processed
+    if sync_import_log_collection.find_one({"file_name": csv_file_path}):
+        print(f"The file '{csv_file_path}' has already been processed. Skipping insertion.")
+        return
+
+    # Decrypt the file frame by frame while streaming the CSV in chunks, and fan
+    # the chunks out to worker processes, keeping at most two chunks per worker
+    # in flight to bound memory
+    results = []
+    with open(csv_file_path, "rb") as encrypted_file, ProcessPoolExecutor(
+        max_workers=INGEST_WORKERS, initializer=_init_worker
+    ) as executor:
+        chunks = pd.read_csv(
+            io.BufferedReader(DecryptingReader(encrypted_file)),
+            encoding="utf-8",
+            chunksize=INGEST_CHUNK_SIZE,
+            keep_default_na=False,
+        )
+        pending = set()
+        for chunk in chunks:
+            if len(pending) >= INGEST_WORKERS * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results += [future.result() for future in done]
+            pending.add(executor.submit(_ingest_chunk, chunk, csv_file_path))
+        results += [future.result() for future in wait(pending).done]
+
+    already_imported = sum(count for count, _, _ in results)
+    if already_imported:
+        print(f"Skipped {already_imported} rows of '{csv_file_path}' that were already imported.")
+    rejected = sum(count for _, count, _ in results)
+    if rejected:
+        first_error = next(error for _, _, error in results if error)
+        print(
+            f"Rejected {rejected} rows while importing '{csv_file_path}'. "
+            f"First error: {first_error}"
+        )
+
+    # Log the file as processed (only once every chunk has been written)
+    sync_import_log_collection.insert_one({"file_name": csv_file_path})
+
+    return {"message": "CSV data uploaded successfully!"}
+
+# Import encrypted CSV files: `python -m scripts.ingest [file ...]`
+# Encrypt a plaintext CSV for import: `python -m scripts.ingest --encrypt SRC DST`
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--encrypt"]:
+        if len(sys.argv) != 4:
+            print("Usage: python -m scripts.ingest --encrypt SRC DST")
+            sys.exit(2)
+        encrypt_csv(sys.argv[2], sys.argv[3])
+        print(f"Encrypted '{sys.argv[2]}' to '{sys.argv[3]}'.")
+        sys.exit(0)
+
+    for csv_file_path in sys.argv[1:] or ["payment_information.csv"]:
+        try:
+            result = normalize_and_save(csv_file_path)
+        except Exception as e:
+            print(f"Error processing file '{csv_file_path}': {e}")
+            sys.exit(1)
+        if result:
+            print(result)
\ No newline at end of file
@@ -0,0 +1,121 @@
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+from models.payments import PAYMENT_JSON_SCHEMA
+from config.database import sync_payments_collection, sync_db
+
+# One-shot schema setup: validator, derived fields, indexes and the search index.
+# Run once per deploy by the Procfile release step, before the CSV import, so
+# imported rows are checked by the validator: `python -m scripts.migrate`.
+
+# Function to create indexes if they don't already exist
+def create_indexes():
+    # List of indexes to ensure
+    indexes_to_create = [
+        {"fields": [("payee_due_date", ASCENDING)], "name": "due_date_index"},
+        {"fields": [("payee_email_lower", ASCENDING)], "name": "email_lower_index"},
+        {
+            "fields": [
+                ("payee_payment_status", ASCENDING),
+                ("payee_due_date", ASCENDING),
+            ],
+            "name": "status_due_date_index",
+        },
+        # Default listing sort (last name, _id as tiebreaker), with and without a status filter
+        {
+            "fields": [
+                ("payee_payment_status", ASCENDING),
+                ("payee_last_name", ASCENDING),
+                ("_id", ASCENDING),
+            ],
+            "name": "status_lastname_idx",
+        },
+        {
+            "fields": [("payee_last_name", ASCENDING), ("_id", ASCENDING)],
+            "name": "lastname_id_idx",
+        },
+    ]
+
+    # Indexes that are no longer needed
+    indexes_to_drop = [
+        "payment_status_index",  # Prefix of the status compound indexes
+        "all_text_fields_index",  # Replaced by the Atlas Search index below
+    ]
+
+    # Get existing indexes
+    existing_indexes = sync_payments_collection.index_information()
+
+    # Create missing indexes
+    for index in indexes_to_create:
+        if index["name"] not in existing_indexes:
+            sync_payments_collection.create_index(index["fields"], name=index["name"])
+            print(f"Index '{index['name']}' created.")
+        else:
+            print(f"Index '{index['name']}' already exists. Skipping.")
+
+    # Drop redundant indexes
+    for name in indexes_to_drop:
+        if name in existing_indexes:
+            sync_payments_collection.drop_index(name)
+            print(f"Index '{name}' dropped.")
+
+# Atlas Search index backing free-text search in GET /payments/
+SEARCH_INDEX = {
+    "name": "payments_search",
+    "definition": {
+        "mappings": {
+            "dynamic": False,
+            "fields": {
+                field: {"type": "string"}
+                for field in (
+                    "payee_first_name",
+                    "payee_last_name",
+                    "payee_email",
+                    "payee_address_line_1",
+                    "payee_address_line_2",
+                    "payee_city",
+                    "payee_country",
+                    "payee_province_or_state",
+                )
+            },
+        }
+    },
+}
+
+# Function to create the Atlas Search index if it doesn't already exist
+def create_search_index():
+    try:
+        sync_db.command({"createSearchIndexes": "payments", "indexes": [SEARCH_INDEX]})
+        print(f"Search index '{SEARCH_INDEX['name']}' created.")
+    except OperationFailure as e:
+        if e.code == 68:  # IndexAlreadyExists
+            print(f"Search index '{SEARCH_INDEX['name']}' already exists. Skipping.")
+        else:
+            print(f"Could not create search index '{SEARCH_INDEX['name']}' (requires Atlas): {e}")
+
+# Enforce the payment schema on the payments collection
+def apply_payment_validator():
+    options = {"validator": {"$jsonSchema": PAYMENT_JSON_SCHEMA}, "validationLevel": "strict"}
+    if "payments" in sync_db.list_collection_names():
+        sync_db.command("collMod", "payments", **options)
+    else:
+        sync_db.create_collection("payments", **options)
+    print("Payment schema validator applied.")
+
+# Populate payee_email_lower on payments stored before it existed
+def backfill_email_lower():
+    result = sync_payments_collection.update_many(
+        {"payee_email_lower": {"$exists": False}, "payee_email": {"$type": "string"}},
+        [{"$set": {"payee_email_lower": {"$toLower": "$payee_email"}}}],
+    )
+    if result.modified_count:
+        print(f"Backfilled payee_email_lower on {result.modified_count} payments.")
+
+# Apply every migration step in order (each step is idempotent)
+def run_migrations():
+    apply_payment_validator()
+    backfill_email_lower()
+    create_indexes()
+    create_search_index()
+
+if __name__ == "__main__":
+    run_migrations()
\ No newline at end of file
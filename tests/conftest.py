@@ -0,0 +1,5 @@
+import os
+
+# config.database requires a connection string at import time; the clients
+# connect lazily, so the unit tests never reach a server
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
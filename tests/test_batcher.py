@@ -0,0 +1,110 @@
+from pymongo.errors import BulkWriteError, WriteError
+from types import SimpleNamespace
+import asyncio
+from config.batcher import UpdateBatcher
+
+# In-memory stand-in for the payments collection: updates match documents whose
+# _id is in `ids`, and setting due_amount to "invalid" fails schema validation
+class FakeCollection:
+    def __init__(self, ids):
+        self.ids = set(ids)
+        self.batches = []
+
+    async def bulk_write(self, ops, ordered):
+        self.batches.append([op._filter["_id"] for op in ops])
+        matched = 0
+        errors = []
+        for index, op in enumerate(ops):
+            if op._filter["_id"] not in self.ids:
+                continue
+            if op._doc["$set"].get("due_amount") == "invalid":
+                errors.append({"index": index, "code": 121, "errmsg": "Document failed validation"})
+            else:
+                matched += 1
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nMatched": matched})
+        return SimpleNamespace(matched_count=matched)
+
+    async def find_one(self, filter, projection):
+        return {"_id": filter["_id"]} if filter["_id"] in self.ids else None
+
+def run_with_batcher(collection, scenario, **options):
+    async def main():
+        batcher = UpdateBatcher(collection, **options)
+        batcher.start()
+        try:
+            return await asyncio.wait_for(scenario(batcher), timeout=5)
+        finally:
+            await batcher.stop()
+    return asyncio.run(main())
+
+def update(batcher, payment_id, **fields):
+    return batcher.update_one({"_id": payment_id}, {"$set": fields or {"due_amount": 1}})
+
+def test_concurrent_updates_share_a_batch():
+    collection = FakeCollection([1, 2, 3])
+
+    async def scenario(batcher):
+        return await asyncio.gather(*(update(batcher, i) for i in (1, 2, 3)))
+
+    assert run_with_batcher(collection, scenario) == [True, True, True]
+    assert collection.batches == [[1, 2, 3]]
+
+def test_missing_payment_returns_false():
+    collection = FakeCollection([1, 3])
+
+    async def scenario(batcher):
+        return await asyncio.gather(*(update(batcher, i) for i in (1, 2, 3)))
+
+    assert run_with_batcher(collection, scenario) == [True, False, True]
+
+def test_validation_failure_raises_write_error():
+    collection = FakeCollection([1, 2])
+
+    async def scenario(batcher):
+        return await asyncio.gather(
+            update(batcher, 1),
+            update(batcher, 2, due_amount="invalid"),
+            return_exceptions=True,
+        )
+
+    valid, invalid = run_with_batcher(collection, scenario)
+    assert valid is True
+    assert isinstance(invalid, WriteError)
+    assert invalid.code == 121
+
+def test_cancelled_caller_does_not_block_its_batch():
+    collection = FakeCollection([1, 2])
+
+    async def scenario(batcher):
+        cancelled = asyncio.create_task(update(batcher, 1))
+        waiting = asyncio.create_task(update(batcher, 2))
+        await asyncio.sleep(0)  # Both updates are queued
+        cancelled.cancel()
+        return await waiting
+
+    assert run_with_batcher(collection, scenario, max_delay=0.05) is True
+    assert collection.batches == [[1, 2]]
+
+def test_batches_are_capped_at_max_ops():
+    collection = FakeCollection(range(5))
+
+    async def scenario(batcher):
+        return await asyncio.gather(*(update(batcher, i) for i in range(5)))
+
+    assert run_with_batcher(collection, scenario, max_ops=2) == [True] * 5
+    assert [len(batch) for batch in collection.batches] == [2, 2, 1]
+
+def test_stop_flushes_pending_updates():
+    collection = FakeCollection([1, 2, 3])
+
+    async def main():
+        batcher = UpdateBatcher(collection, max_delay=0.05)
+        batcher.start()
+        updates = [asyncio.create_task(update(batcher, i)) for i in (1, 2, 3)]
+        await asyncio.sleep(0)  # All three are queued ahead of the stop sentinel
+        await asyncio.wait_for(batcher.stop(), timeout=5)
+        return [task.result() for task in updates]
+
+    assert asyncio.run(main()) == [True, True, True]
+    assert collection.batches == [[1, 2, 3]]
@@ -0,0 +1,92 @@
+from bson import ObjectId, json_util
+from datetime import datetime, timezone
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING
+import base64
+import pytest
+from routes.route import decode_cursor, encode_cursor, keyset_filter
+
+LAST_ID = ObjectId("0123456789ab0123456789ab")
+
+def raw_cursor(text):
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+# keyset_filter
+
+def test_keyset_filter_ascending_after_value():
+    assert keyset_filter("payee_last_name", ASCENDING, "Smith", LAST_ID) == {
+        "$or": [
+            {"payee_last_name": "Smith", "_id": {"$gt": LAST_ID}},
+            {"payee_last_name": {"$gt": "Smith"}},
+        ]
+    }
+
+def test_keyset_filter_ascending_after_null():
+    # Nulls sort first, so every non-null value still follows
+    assert keyset_filter("payee_last_name", ASCENDING, None, LAST_ID) == {
+        "$or": [
+            {"payee_last_name": None, "_id": {"$gt": LAST_ID}},
+            {"payee_last_name": {"$ne": None}},
+        ]
+    }
+
+def test_keyset_filter_descending_after_value():
+    # Nulls sort last when descending, and $lt never matches them
+    assert keyset_filter("payee_last_name", DESCENDING, "Smith", LAST_ID) == {
+        "$or": [
+            {"payee_last_name": "Smith", "_id": {"$lt": LAST_ID}},
+            {"payee_last_name": {"$lt": "Smith"}},
+            {"payee_last_name": None},
+        ]
+    }
+
+def test_keyset_filter_descending_after_null():
+    # Only the remaining nulls are left
+    assert keyset_filter("payee_last_name", DESCENDING, None, LAST_ID) == {
+        "$or": [{"payee_last_name": None, "_id": {"$lt": LAST_ID}}]
+    }
+
+# decode_cursor
+
+@pytest.mark.parametrize("value", [
+    "Smith",
+    42,
+    12.5,
+    None,
+    datetime(2025, 1, 2, tzinfo=timezone.utc),
+])
+def test_decode_cursor_round_trips_encode_cursor(value):
+    cursor = encode_cursor({"payee_last_name": value, "_id": LAST_ID}, "payee_last_name")
+    last_value, last_id = decode_cursor(cursor)
+    assert last_value == value
+    assert last_id == LAST_ID
+
+@pytest.mark.parametrize("text", [
+    # Query operators smuggled in as the sort value or the _id
+    '[{"$regex": "^a"}, {"$oid": "0123456789ab0123456789ab"}]',
+    '[{"$gt": ""}, {"$oid": "0123456789ab0123456789ab"}]',
+    '["Smith", {"$ne": null}]',
+    # Malformed extended JSON
+    '[1, {"$oid": "zz"}]',
+    '[{"$numberDecimal": "abc"}, {"$oid": "0123456789ab0123456789ab"}]',
+    '[{"$date": "x"}, {"$oid": "0123456789ab0123456789ab"}]',
+    # Wrong shape
+    '["Smith"]',
+    '{"a": 1}',
+    "not json",
+])
+def test_decode_cursor_rejects_invalid_cursors(text):
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(raw_cursor(text))
+    assert exc_info.value.status_code == 400
+
+def test_decode_cursor_rejects_decimal_sort_value():
+    text = json_util.dumps([{"$numberDecimal": "1.5"}, LAST_ID])
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(raw_cursor(text))
+    assert exc_info.value.status_code == 400
+
+def test_decode_cursor_rejects_bad_base64():
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor("%%%")
+    assert exc_info.value.status_code == 400